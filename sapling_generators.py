@@ -2,7 +2,7 @@
 from pyblake2 import blake2s
 
 from sapling_jubjub import Point, JUBJUB_COFACTOR
-from tv_output import render_args, render_tv
+from tv_output import render_args, render_tv, verify_tv
 from sapling_utils import i2leosp
 
 # First 64 bytes of the BLAKE2s input during group hash.
@@ -53,34 +53,47 @@ required_bases = 4
 PEDERSEN_BASES = [find_group_hash(b'Zcash_PH', i2leosp(32, iminus1))
                   for iminus1 in range(0, required_bases)]
 
+GENERATORS_PARTS = (
+    ('skb', '[u8; 32]'),
+    ('pkb', '[u8; 32]'),
+    ('npb', '[u8; 32]'),
+    ('wprb', '[u8; 32]'),
+    ('vcvb', '[u8; 32]'),
+    ('vcrb', '[u8; 32]'),
+    ('pb0', '[u8; 32]'),
+    ('pb1', '[u8; 32]'),
+    ('pb2', '[u8; 32]'),
+    ('pb3', '[u8; 32]'),
+)
+
+def generators_tv():
+    return {
+        'skb': bytes(SPENDING_KEY_BASE),
+        'pkb': bytes(PROVING_KEY_BASE),
+        'npb': bytes(NOTE_POSITION_BASE),
+        'wprb': bytes(WINDOWED_PEDERSEN_RANDOMNESS_BASE),
+        'vcvb': bytes(VALUE_COMMITMENT_VALUE_BASE),
+        'vcrb': bytes(VALUE_COMMITMENT_RANDOMNESS_BASE),
+        'pb0': bytes(PEDERSEN_BASES[0]),
+        'pb1': bytes(PEDERSEN_BASES[1]),
+        'pb2': bytes(PEDERSEN_BASES[2]),
+        'pb3': bytes(PEDERSEN_BASES[3]),
+    }
+
+def recompute_generators_tv(tv):
+    return generators_tv()
+
 def main():
+    args = render_args()
+    if args.verify:
+        verify_tv(args, 'sapling_generators', GENERATORS_PARTS, recompute_generators_tv)
+        return
+
     render_tv(
-        render_args(),
+        args,
         'sapling_generators',
-        (
-            ('skb', '[u8; 32]'),
-            ('pkb', '[u8; 32]'),
-            ('npb', '[u8; 32]'),
-            ('wprb', '[u8; 32]'),
-            ('vcvb', '[u8; 32]'),
-            ('vcrb', '[u8; 32]'),
-            ('pb0', '[u8; 32]'),
-            ('pb1', '[u8; 32]'),
-            ('pb2', '[u8; 32]'),
-            ('pb3', '[u8; 32]'),
-        ),
-        {
-            'skb': bytes(SPENDING_KEY_BASE),
-            'pkb': bytes(PROVING_KEY_BASE),
-            'npb': bytes(NOTE_POSITION_BASE),
-            'wprb': bytes(WINDOWED_PEDERSEN_RANDOMNESS_BASE),
-            'vcvb': bytes(VALUE_COMMITMENT_VALUE_BASE),
-            'vcrb': bytes(VALUE_COMMITMENT_RANDOMNESS_BASE),
-            'pb0': bytes(PEDERSEN_BASES[0]),
-            'pb1': bytes(PEDERSEN_BASES[1]),
-            'pb2': bytes(PEDERSEN_BASES[2]),
-            'pb3': bytes(PEDERSEN_BASES[3]),
-        },
+        GENERATORS_PARTS,
+        generators_tv(),
     )
 
 
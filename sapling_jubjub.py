@@ -12,35 +12,74 @@ assert (q_j - 1) // 2 == qm1d2
 # Field arithmetic
 #
 
+# The functions below operate on plain ints reduced mod q_j, so that hot
+# loops do not allocate a FieldElement per operation.
+
+def fq_inv(a):
+    return pow(a, q_j - 2, q_j)
+
+def fq_sqrt(a):
+    # Tonelli-Shank's algorithm for q mod 16 = 1
+    # https://eprint.iacr.org/2012/685.pdf (page 12, algorithm 5)
+    a %= q_j
+    l = pow(a, qm1d2, q_j)
+    if l == 1:
+        c = 10238227357739495823651030575849232062558860180284477541189508159991286009131
+        r = pow(a, 6104339283789297388802252303364915521546564123189034618274734669824, q_j)
+        t = pow(a, 12208678567578594777604504606729831043093128246378069236549469339647, q_j)
+        m = 32
+
+        # 7: while b != 1 do
+        while t != 1:
+            # 8: Find least integer k >= 0 such that b^(2^k) == 1
+            i = 1
+            t2i = t * t % q_j
+            while t2i != 1:
+                t2i = t2i * t2i % q_j
+                i += 1
+            assert i < m
+
+            # 9:
+            # w <- z^(2^(v-k-1))
+            for _ in range(0, m - i - 1):
+                c = c * c % q_j
+            # b <- bz
+            r = r * c % q_j
+            # z <- w^2
+            c = c * c % q_j
+            # x <- xw
+            t = t * c % q_j
+            # v <- k
+            m = i
+        assert r * r % q_j == a
+        return r
+    elif l == q_j - 1:
+        return None
+    return 0
+
 class FieldElement(object):
-    def __init__(self, t, s, modulus, strict=False):
-        if strict and not (0 <= s and s < modulus):
+    __slots__ = ('s',)
+
+    def __init__(self, s, strict=False):
+        if strict and not (0 <= s and s < self.m):
             raise ValueError
-        self.t = t
-        self.s = s % modulus
-        self.m = modulus
+        self.s = s % self.m
 
     def __add__(self, a):
-        return self.t(self.s + a.s)
+        return type(self)(self.s + a.s)
 
     def __sub__(self, a):
-        return self.t(self.s - a.s)
+        return type(self)(self.s - a.s)
 
     def __mul__(self, a):
-        return self.t(self.s * a.s)
+        return type(self)(self.s * a.s)
 
     def __truediv__(self, a):
         assert a.s != 0
         return self * a.inv()
 
     def exp(self, e):
-        e = format(e, '0256b')
-        ret = self.t(1)
-        for c in e:
-            ret = ret * ret
-            if int(c):
-                ret = ret * self
-        return ret
+        return type(self)(pow(self.s, e, self.m))
 
     def inv(self):
         return self.exp(self.m - 2)
@@ -55,60 +94,27 @@ class FieldElement(object):
         return self.s == a.s
 
 
-
 class Fq(FieldElement):
+    __slots__ = ()
+    m = q_j
+
     @staticmethod
     def from_bytes(buf):
         return Fq(leos2ip(buf), strict=True)
 
-    def __init__(self, s, strict=False):
-        FieldElement.__init__(self, Fq, s, q_j, strict=strict)
-
     def __str__(self):
         return 'Fq(%s)' % self.s
 
     def sqrt(self):
-        # Tonelli-Shank's algorithm for q mod 16 = 1
-        # https://eprint.iacr.org/2012/685.pdf (page 12, algorithm 5)
-        a = self.exp(qm1d2)
-        if a == self.ONE:
-            c = Fq(10238227357739495823651030575849232062558860180284477541189508159991286009131)
-            r = self.exp(6104339283789297388802252303364915521546564123189034618274734669824)
-            t = self.exp(12208678567578594777604504606729831043093128246378069236549469339647)
-            m = 32
-
-            # 7: while b != 1 do
-            while t != self.ONE:
-                # 8: Find least integer k >= 0 such that b^(2^k) == 1
-                i = 1
-                t2i = t * t
-                while t2i != self.ONE:
-                    t2i = t2i * t2i
-                    i += 1
-                assert i < m
-
-                # 9:
-                # w <- z^(2^(v-k-1))
-                for _ in range(0, m - i - 1):
-                    c = c * c
-                # b <- bz
-                r = r * c
-                # z <- w^2
-                c = c * c
-                # x <- xw
-                t = t * c
-                # v <- k
-                m = i
-            assert r * r == self
-            return r
-        elif a == self.MINUS_ONE:
+        r = fq_sqrt(self.s)
+        if r is None:
             return None
-        return self.ZERO
+        return Fq(r)
 
 
 class Fr(FieldElement):
-    def __init__(self, s, strict=False):
-        FieldElement.__init__(self, Fr, s, r_j, strict=strict)
+    __slots__ = ()
+    m = r_j
 
     def __str__(self):
         return 'Fr(%s)' % self.s
@@ -139,60 +145,144 @@ JUBJUB_A = Fq.MINUS_ONE
 JUBJUB_D = Fq(-10240) / Fq(10241)
 JUBJUB_COFACTOR = Fr(8)
 
+# Extended twisted Edwards coordinates (X, Y, T, Z) as plain ints, with
+# u = X/Z, v = Y/Z and T = XY/Z. The formulas are from
+# https://eprint.iacr.org/2008/522.pdf and are complete on Jubjub, so
+# scalar multiplication needs a single inversion at the end.
+
+_d = JUBJUB_D.s
+
+EXT_ZERO = (0, 1, 0, 1)
+
+def ext_from_affine(u, v):
+    return (u, v, u * v % q_j, 1)
+
+def ext_to_affine(P):
+    (X, Y, _, Z) = P
+    zinv = fq_inv(Z)
+    return (X * zinv % q_j, Y * zinv % q_j)
+
+def ext_batch_to_affine(Ps):
+    # Montgomery's trick: one inversion shared by all the points
+    prefix = [1]
+    for (_, _, _, Z) in Ps:
+        prefix.append(prefix[-1] * Z % q_j)
+    inv = fq_inv(prefix[-1])
+    ret = [None] * len(Ps)
+    for i in reversed(range(0, len(Ps))):
+        (X, Y, _, Z) = Ps[i]
+        zinv = inv * prefix[i] % q_j
+        inv = inv * Z % q_j
+        ret[i] = (X * zinv % q_j, Y * zinv % q_j)
+    return ret
+
+def ext_add(P1, P2):
+    (X1, Y1, T1, Z1) = P1
+    (X2, Y2, T2, Z2) = P2
+    A = X1 * X2 % q_j
+    B = Y1 * Y2 % q_j
+    C = _d * T1 % q_j * T2 % q_j
+    D = Z1 * Z2 % q_j
+    E = ((X1 + Y1) * (X2 + Y2) - A - B) % q_j
+    F = D - C
+    G = D + C
+    H = B + A # B - a*A with a = -1
+    return (E * F % q_j, G * H % q_j, E * H % q_j, F * G % q_j)
+
+def ext_double(P):
+    (X, Y, _, Z) = P
+    A = X * X % q_j
+    B = Y * Y % q_j
+    C = 2 * Z * Z % q_j
+    D = -A # a*A with a = -1
+    E = ((X + Y) * (X + Y) - A - B) % q_j
+    G = D + B
+    F = G - C
+    H = D - B
+    return (E * F % q_j, G * H % q_j, E * H % q_j, F * G % q_j)
+
+def ext_mul(P, s):
+    ret = EXT_ZERO
+    for c in format(s, 'b'):
+        ret = ext_double(ret)
+        if c == '1':
+            ret = ext_add(ret, P)
+    return ret
+
+def ext_neg(P):
+    (X, Y, T, Z) = P
+    return (-X % q_j, Y, -T % q_j, Z)
+
+# Points keep their affine coordinates as plain ints; the Fq wrappers
+# are only built when u or v is accessed.
 class Point(object):
+    __slots__ = ('_u', '_v')
+
     @staticmethod
     def from_bytes(buf):
         assert len(buf) == 32
         u_sign = buf[31] >> 7
         buf = buf[:31] + bytes([buf[31] & 0b01111111])
         try:
-            v = Fq.from_bytes(buf)
+            v = Fq.from_bytes(buf).s
         except ValueError:
             return None
 
-        vv = v * v
-        u2 = (vv - Fq.ONE) / (vv * JUBJUB_D - JUBJUB_A)
+        vv = v * v % q_j
+        u2 = (vv - 1) * fq_inv((vv * _d + 1) % q_j) # vv*d - a with a = -1
 
-        u = u2.sqrt()
-        if not u:
+        u = fq_sqrt(u2)
+        if u is None:
             return None
 
-        if u.s % 2 != u_sign:
-            u = Fq.ZERO - u
+        if u % 2 != u_sign:
+            u = (-u) % q_j
+
+        return Point.from_ints(u, v)
+
+    @staticmethod
+    def from_ints(u, v):
+        P = Point.__new__(Point)
+        P._u = u
+        P._v = v
+        return P
 
-        return Point(u, v)
+    @staticmethod
+    def from_ext(P):
+        return Point.from_ints(*ext_to_affine(P))
 
     def __init__(self, u, v):
-        self.u = u
-        self.v = v
+        self._u = u.s
+        self._v = v.s
+
+    @property
+    def u(self):
+        return Fq(self._u)
+
+    @property
+    def v(self):
+        return Fq(self._v)
+
+    def ext(self):
+        return ext_from_affine(self._u, self._v)
 
     def __add__(self, a):
-        (u1, v1) = (self.u, self.v)
-        (u2, v2) = (a.u, a.v)
-        u3 = (u1*v2 + v1*u2) / (Fq.ONE + JUBJUB_D*u1*u2*v1*v2)
-        v3 = (v1*v2 - JUBJUB_A*u1*u2) / (Fq.ONE - JUBJUB_D*u1*u2*v1*v2)
-        return Point(u3, v3)
+        return Point.from_ext(ext_add(self.ext(), a.ext()))
 
     def double(self):
-        return self + self
+        return Point.from_ext(ext_double(self.ext()))
 
     def __mul__(self, s):
-        s = format(s.s, '0256b')
-        ret = self.ZERO
-        for c in s:
-            ret = ret.double()
-            if int(c):
-                ret = ret + self
-        return ret
+        return Point.from_ext(ext_mul(self.ext(), s.s))
 
     def __bytes__(self):
-        buf = bytes(self.v)
-        if self.u.s % 2 == 1:
+        buf = i2leosp(256, self._v)
+        if self._u % 2 == 1:
             buf = buf[:31] + bytes([buf[31] | (1 << 7)])
         return buf
 
     def __eq__(self, a):
-        return self.u == a.u and self.v == a.v
+        return self._u == a._u and self._v == a._v
 
     def __str__(self):
         return 'Point(%s, %s)' % (self.u, self.v)
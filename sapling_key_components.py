@@ -5,8 +5,9 @@ from sapling_generators import PROVING_KEY_BASE, SPENDING_KEY_BASE, group_hash
 from sapling_jubjub import Fr
 from sapling_merkle_tree import MERKLE_DEPTH
 from sapling_notes import note_commit, note_nullifier
+from sapling_point_tables import fixed_base_mul
 from sapling_utils import leos2bsp, leos2ip
-from tv_output import render_args, render_tv
+from tv_output import render_args, render_tv, verify_tv
 
 #
 # Utilities
@@ -65,11 +66,11 @@ class SpendingKey(object):
 
     @cached
     def ak(self):
-        return SPENDING_KEY_BASE * self.ask()
+        return fixed_base_mul(SPENDING_KEY_BASE, self.ask())
 
     @cached
     def nk(self):
-        return PROVING_KEY_BASE * self.nsk()
+        return fixed_base_mul(PROVING_KEY_BASE, self.nsk())
 
     @cached
     def ivk(self):
@@ -90,57 +91,72 @@ class SpendingKey(object):
         return group_hash(b'Zcash_gd', self.default_d()) * self.ivk()
 
 
+def key_components_tv(sk, note_v, note_r, note_pos):
+    note_cm = note_commit(
+        note_r,
+        leos2bsp(bytes(group_hash(b'Zcash_gd', sk.default_d()))),
+        leos2bsp(bytes(sk.default_pkd())),
+        note_v)
+    note_nf = note_nullifier(sk.nk(), note_cm, Fr(note_pos))
+    return {
+        'sk': sk.data,
+        'ask': bytes(sk.ask()),
+        'nsk': bytes(sk.nsk()),
+        'ovk': sk.ovk(),
+        'ak': bytes(sk.ak()),
+        'nk': bytes(sk.nk()),
+        'ivk': bytes(sk.ivk()),
+        'default_d': sk.default_d(),
+        'default_pk_d': bytes(sk.default_pkd()),
+        'note_v': note_v,
+        'note_r': bytes(note_r),
+        'note_cm': bytes(note_cm.u),
+        'note_pos': note_pos,
+        'note_nf': note_nf,
+    }
+
+def recompute_key_components_tv(tv):
+    return key_components_tv(
+        SpendingKey(tv['sk']),
+        tv['note_v'],
+        to_scalar(tv['note_r']),
+        tv['note_pos'])
+
+KEY_COMPONENTS_PARTS = (
+    ('sk', '[u8; 32]'),
+    ('ask', '[u8; 32]'),
+    ('nsk', '[u8; 32]'),
+    ('ovk', '[u8; 32]'),
+    ('ak', '[u8; 32]'),
+    ('nk', '[u8; 32]'),
+    ('ivk', '[u8; 32]'),
+    ('default_d', '[u8; 11]'),
+    ('default_pk_d', '[u8; 32]'),
+    ('note_v', 'u64'),
+    ('note_r', '[u8; 32]'),
+    ('note_cm', '[u8; 32]'),
+    ('note_pos', 'u64'),
+    ('note_nf', '[u8; 32]'),
+)
+
 def main():
     args = render_args()
+    if args.verify:
+        verify_tv(args, 'sapling_key_components', KEY_COMPONENTS_PARTS, recompute_key_components_tv)
+        return
 
     test_vectors = []
     for i in range(0, 10):
         sk = SpendingKey(bytes([i] * 32))
         note_v = (2548793025584392057432895043257984320*i) % 2**64
         note_r = Fr(8890123457840276890326754358439057438290574382905).exp(i+1)
-        note_cm = note_commit(
-            note_r,
-            leos2bsp(bytes(group_hash(b'Zcash_gd', sk.default_d()))),
-            leos2bsp(bytes(sk.default_pkd())),
-            note_v)
         note_pos = (980705743285409327583205473820957432*i) % 2**MERKLE_DEPTH
-        note_nf = note_nullifier(sk.nk(), note_cm, Fr(note_pos))
-        test_vectors.append({
-            'sk': sk.data,
-            'ask': bytes(sk.ask()),
-            'nsk': bytes(sk.nsk()),
-            'ovk': sk.ovk(),
-            'ak': bytes(sk.ak()),
-            'nk': bytes(sk.nk()),
-            'ivk': bytes(sk.ivk()),
-            'default_d': sk.default_d(),
-            'default_pk_d': bytes(sk.default_pkd()),
-            'note_v': note_v,
-            'note_r': bytes(note_r),
-            'note_cm': bytes(note_cm.u),
-            'note_pos': note_pos,
-            'note_nf': note_nf,
-        })
+        test_vectors.append(key_components_tv(sk, note_v, note_r, note_pos))
 
     render_tv(
         args,
         'sapling_key_components',
-        (
-            ('sk', '[u8; 32]'),
-            ('ask', '[u8; 32]'),
-            ('nsk', '[u8; 32]'),
-            ('ovk', '[u8; 32]'),
-            ('ak', '[u8; 32]'),
-            ('nk', '[u8; 32]'),
-            ('ivk', '[u8; 32]'),
-            ('default_d', '[u8; 11]'),
-            ('default_pk_d', '[u8; 32]'),
-            ('note_v', 'u64'),
-            ('note_r', '[u8; 32]'),
-            ('note_cm', '[u8; 32]'),
-            ('note_pos', 'u64'),
-            ('note_nf', '[u8; 32]'),
-        ),
+        KEY_COMPONENTS_PARTS,
         test_vectors,
     )
 
@@ -1,8 +1,12 @@
 #!/usr/bin/env python3
 from binascii import unhexlify
+from multiprocessing import Pool
+import os
+import struct
+import tempfile
 
 from sapling_pedersen import pedersen_hash
-from sapling_utils import i2lebsp, leos2bsp
+from sapling_utils import i2lebsp, lebs2osp, leos2bsp
 
 MERKLE_DEPTH = 32
 
@@ -14,6 +18,150 @@ def merkle_crh(layer, left, right):
     return pedersen_hash(b'Zcash_PH', l + left + right)
 
 
+#
+# Empty subtrees
+#
+
+UNCOMMITTED = i2lebsp(255, 1)
+
+_EMPTY_ROOTS = [UNCOMMITTED]
+
+def empty_root(height):
+    assert 0 <= height <= MERKLE_DEPTH
+    while len(_EMPTY_ROOTS) <= height:
+        h = len(_EMPTY_ROOTS) - 1
+        _EMPTY_ROOTS.append(merkle_crh(MERKLE_DEPTH - 1 - h, _EMPTY_ROOTS[h], _EMPTY_ROOTS[h]))
+    return _EMPTY_ROOTS[height]
+
+
+#
+# Bulk tree construction
+#
+# The layer file stores every non-empty node of the tree, lowest layer
+# first, as 32-byte LEBS2OSP encodings. Nodes missing from a layer are
+# roots of empty subtrees, so they are not stored.
+#
+
+LAYER_FILE_MAGIC = b'ZTVMRKL1'
+LAYER_FILE_HEADER = struct.Struct('<8sBQ')
+NODE_SIZE = 32
+
+# Levels with fewer pairs than this are hashed in the parent process.
+PARALLEL_THRESHOLD = 8
+
+def layer_sizes(n):
+    sizes = []
+    for height in range(0, MERKLE_DEPTH + 1):
+        sizes.append(n)
+        n = (n + 1) // 2
+    return sizes
+
+def _hash_level(pool, height, nodes):
+    if len(nodes) % 2 == 1:
+        nodes = nodes + [empty_root(height)]
+    args = [(MERKLE_DEPTH - 1 - height, nodes[i], nodes[i+1])
+            for i in range(0, len(nodes), 2)]
+    if pool is None or len(args) < PARALLEL_THRESHOLD:
+        return [merkle_crh(*a) for a in args]
+    return pool.starmap(merkle_crh, args, chunksize=max(1, len(args) // 64))
+
+def build_tree(leaves, processes=None, layer_file=None):
+    leaves = list(leaves)
+    assert len(leaves) <= 2**MERKLE_DEPTH
+    for leaf in leaves:
+        assert len(leaf) == 255
+
+    out = None
+    if layer_file is not None:
+        out = open(layer_file, 'wb')
+        out.write(LAYER_FILE_HEADER.pack(LAYER_FILE_MAGIC, MERKLE_DEPTH, len(leaves)))
+
+    pool = None
+    try:
+        nodes = leaves
+        for height in range(0, MERKLE_DEPTH):
+            if not nodes:
+                break
+            # Levels only shrink, so the pool is started for the lowest
+            # level that is wide enough to use it, if any.
+            if pool is None and processes != 1 and (len(nodes) + 1) // 2 >= PARALLEL_THRESHOLD:
+                pool = Pool(processes)
+            if out:
+                out.write(b''.join([lebs2osp(node) for node in nodes]))
+            nodes = _hash_level(pool, height, nodes)
+        if not nodes:
+            return empty_root(MERKLE_DEPTH)
+        root = nodes[0]
+        if out:
+            out.write(lebs2osp(root))
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+        if out:
+            out.close()
+    return root
+
+
+#
+# Layer file access
+#
+
+class LayerFile(object):
+    def __init__(self, filename):
+        self._f = open(filename, 'rb')
+        header = self._f.read(LAYER_FILE_HEADER.size)
+        if len(header) != LAYER_FILE_HEADER.size:
+            self._f.close()
+            raise ValueError('Invalid layer file: %s' % filename)
+        (magic, depth, n) = LAYER_FILE_HEADER.unpack(header)
+        if magic != LAYER_FILE_MAGIC or depth != MERKLE_DEPTH or n > 2**MERKLE_DEPTH:
+            self._f.close()
+            raise ValueError('Invalid layer file: %s' % filename)
+        self.size = n
+        self._sizes = layer_sizes(n)
+        self._offsets = []
+        offset = LAYER_FILE_HEADER.size
+        for count in self._sizes:
+            self._offsets.append(offset)
+            offset += count * NODE_SIZE
+        if os.fstat(self._f.fileno()).st_size != offset:
+            self._f.close()
+            raise ValueError('Truncated or oversized layer file: %s' % filename)
+
+    def close(self):
+        self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def node(self, height, index):
+        if index >= self._sizes[height]:
+            return empty_root(height)
+        self._f.seek(self._offsets[height] + index * NODE_SIZE)
+        return leos2bsp(self._f.read(NODE_SIZE))[:255]
+
+    def root(self):
+        return self.node(MERKLE_DEPTH, 0)
+
+    def auth_path(self, pos):
+        assert pos < self.size
+        return [self.node(height, (pos >> height) ^ 1) for height in range(0, MERKLE_DEPTH)]
+
+def merkle_root_from_path(leaf, pos, path):
+    assert len(path) == MERKLE_DEPTH
+    node = leaf
+    for height in range(0, MERKLE_DEPTH):
+        if (pos >> height) & 1:
+            node = merkle_crh(MERKLE_DEPTH - 1 - height, path[height], node)
+        else:
+            node = merkle_crh(MERKLE_DEPTH - 1 - height, node, path[height])
+    return node
+
+
 a = unhexlify('87a086ae7d2252d58729b30263fb7b66308bf94ef59a76c9c86e7ea016536505')[::-1]
 b = unhexlify('a75b84a125b2353da7e8d96ee2a15efe4de23df9601b9d9564ba59de57130406')[::-1]
 c = unhexlify('5bf43b5736c19b714d1f462c9d22ba3492c36e3d9bbd7ca24d94b440550aa561')[::-1]
@@ -22,3 +170,27 @@ b = leos2bsp(b)[:255]
 c = leos2bsp(c)[:255]
 assert merkle_crh(MERKLE_DEPTH - 1 - 25, a, b) == c
 assert merkle_crh(MERKLE_DEPTH - 1 - 26, a, b) != c
+
+_root = build_tree([a, b, c], processes=1)
+_path = [empty_root(0), merkle_crh(MERKLE_DEPTH - 1, a, b)] + [empty_root(h) for h in range(2, MERKLE_DEPTH)]
+assert merkle_root_from_path(c, 2, _path) == _root
+assert build_tree([], processes=1) == empty_root(MERKLE_DEPTH)
+
+
+def main():
+    (fd, layer_file) = tempfile.mkstemp()
+    os.close(fd)
+    try:
+        for n in range(0, 6):
+            leaves = [i2lebsp(255, i) for i in range(0, n)]
+            root = build_tree(leaves, processes=1, layer_file=layer_file)
+            with LayerFile(layer_file) as lf:
+                assert lf.root() == root
+                for pos in range(0, n):
+                    assert merkle_root_from_path(leaves[pos], pos, lf.auth_path(pos)) == root
+    finally:
+        os.remove(layer_file)
+
+
+if __name__ == '__main__':
+    main()
@@ -3,12 +3,18 @@ from pyblake2 import blake2s
 
 from sapling_pedersen import (
     mixing_pedersen_hash,
-    windowed_pedersen_commitment,
+    windowed_pedersen_commitment_from_point,
+    PedersenHasher,
 )
 from sapling_utils import i2lebsp
 
 def note_commit(rcm, g_d, pk_d, v):
-    return windowed_pedersen_commitment(rcm, [1] * 6 + i2lebsp(64, v) + g_d + pk_d)
+    hasher = PedersenHasher(b'Zcash_PH')
+    hasher.update([1] * 6)
+    hasher.update(i2lebsp(64, v))
+    hasher.update(g_d)
+    hasher.update(pk_d)
+    return windowed_pedersen_commitment_from_point(rcm, hasher.finalize_point())
 
 def prf_nf_sapling(nk_star, rho_star):
     digest = blake2s(person=b'Zcash_nf')
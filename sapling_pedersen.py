@@ -1,11 +1,22 @@
 #!/usr/bin/env python3
+from binascii import unhexlify
+
 from sapling_generators import (
-    find_group_hash,
     NOTE_POSITION_BASE,
+    VALUE_COMMITMENT_RANDOMNESS_BASE,
     WINDOWED_PEDERSEN_RANDOMNESS_BASE,
 )
-from sapling_jubjub import Fr, Point
-from sapling_utils import cldiv, i2leosp
+from sapling_jubjub import (
+    EXT_ZERO,
+    ext_add,
+    ext_batch_to_affine,
+    ext_neg,
+    r_j,
+    Fr,
+    Point,
+)
+from sapling_point_tables import fixed_base, fixed_base_ext_mul, fixed_base_mul
+from sapling_utils import i2leosp, leos2bsp
 
 
 #
@@ -13,42 +24,137 @@ from sapling_utils import cldiv, i2leosp
 #
 
 def I_D_i(D, i):
-    return find_group_hash(D, i2leosp(32, i - 1))
+    return fixed_base(D, i2leosp(32, i - 1))
 
 def encode_chunk(mj):
     (s0, s1, s2) = mj
     return (1 - 2*s2) * (1 + s0 + 2*s1)
 
-def encode_segment(Mi):
-    ki = len(Mi) // 3
-    Michunks = [Mi[i:i+3] for i in range(0, len(Mi), 3)]
-    assert len(Michunks) == ki
-    return Fr(sum([encode_chunk(Michunks[j-1]) * 2**(4*(j-1)) for j in range(1, ki + 1)]))
-
 c = 63
 
+# Incremental form of PedersenHash. Each segment is folded into the
+# running point as soon as its last chunk arrives, so only a partial
+# chunk of at most 2 bits is buffered between calls to update().
+class PedersenHasher(object):
+    def __init__(self, D):
+        self.D = D
+        self._acc = EXT_ZERO
+        self._i = 1         # index of the current segment
+        self._j = 0         # number of chunks encoded in the current segment
+        self._sum = 0       # encoding of the current segment so far
+        self._chunk = []    # pending bits of the current chunk
+        self._finalized = False
+
+    def _fold_segment(self):
+        # I_D_i(D, i) * sum
+        P = fixed_base_ext_mul(self.D, i2leosp(32, self._i - 1), self._sum % r_j)
+        self._acc = ext_add(self._acc, P)
+        self._i += 1
+        self._j = 0
+        self._sum = 0
+
+    def update(self, M):
+        if self._finalized:
+            raise ValueError('PedersenHasher already finalized')
+        if type(M) == bytes:
+            M = leos2bsp(M)
+        for b in M:
+            self._chunk.append(b)
+            if len(self._chunk) == 3:
+                self._sum += encode_chunk(self._chunk) * 2**(4*self._j)
+                self._chunk = []
+                self._j += 1
+                if self._j == c:
+                    self._fold_segment()
+        return self
+
+    def finalize_point(self):
+        # Pad M to a multiple of 3 bits
+        if self._chunk:
+            self.update([0] * (3 - len(self._chunk)))
+        if self._j > 0:
+            self._fold_segment()
+        self._finalized = True
+        return Point.from_ext(self._acc)
+
+    def finalize(self):
+        return self.finalize_point().u.bits(255)
+
 def pedersen_hash_to_point(D, M):
-    # Pad M to a multiple of 3 bits
-    Mdash = M + [0] * ((-len(M)) % 3)
-    assert (len(Mdash) // 3) * 3 == len(Mdash)
-    n = cldiv(len(Mdash), 3 * c)
-    Msegs = [Mdash[i:i+(3*c)] for i in range(0, len(Mdash), 3*c)]
-    assert len(Msegs) == n
-    return sum([I_D_i(D, i) * encode_segment(Msegs[i-1]) for i in range(1, n + 1)], Point.ZERO)
+    return PedersenHasher(D).update(M).finalize_point()
 
 def pedersen_hash(D, M):
     return pedersen_hash_to_point(D, M).u.bits(255)
 
 def mixing_pedersen_hash(P, x):
-    return P + NOTE_POSITION_BASE * x
+    return P + fixed_base_mul(NOTE_POSITION_BASE, x)
+
+
+# Six segments, so the last two bases are not in the point table.
+_M = [(i * 7 + i // 5) % 3 % 2 for i in range(0, 1000)]
+_H = leos2bsp(unhexlify('76a38844b17812eda020540c1a31f0983ead10948eb0db95409dff9b1d370b02'))[:255]
+assert pedersen_hash(b'Zcash_PH', _M) == _H
+_hasher = PedersenHasher(b'Zcash_PH')
+for (_start, _end) in [(0, 1), (1, 1), (1, 5), (5, 190), (190, 191), (191, 1000)]:
+    _hasher.update(_M[_start:_end])
+assert _hasher.finalize() == _H
+assert PedersenHasher(b'Zcash_PH').finalize() == pedersen_hash(b'Zcash_PH', [])
 
 
 #
 # Pedersen commitments
 #
 
+def windowed_pedersen_commitment_from_point(r, P):
+    return P + fixed_base_mul(WINDOWED_PEDERSEN_RANDOMNESS_BASE, r)
+
 def windowed_pedersen_commitment(r, s):
-    return pedersen_hash_to_point(b'Zcash_PH', s) + WINDOWED_PEDERSEN_RANDOMNESS_BASE * r
+    return windowed_pedersen_commitment_from_point(r, pedersen_hash_to_point(b'Zcash_PH', s))
+
+def _homomorphic_pedersen_commitment_ext(rcv, D, v):
+    return ext_add(fixed_base_ext_mul(D, b'v', v.s), fixed_base_ext_mul(D, b'r', rcv.s))
 
 def homomorphic_pedersen_commitment(rcv, D, v):
-    return find_group_hash(D, b'v') * v + find_group_hash(D, b'r') * rcv
+    return Point.from_ext(_homomorphic_pedersen_commitment_ext(rcv, D, v))
+
+def _homomorphic_pedersen_commitments_ext(D, values):
+    return [_homomorphic_pedersen_commitment_ext(rcv, D, v) for (v, rcv) in values]
+
+def homomorphic_pedersen_commitments(D, values):
+    cvs = _homomorphic_pedersen_commitments_ext(D, values)
+    return [Point.from_ints(u, v) for (u, v) in ext_batch_to_affine(cvs)]
+
+
+#
+# Binding keys
+#
+
+# Takes lists of (v, rcv) for the spends and outputs of a transaction and
+# returns (cv_spends, cv_outputs, value_balance, bsk, bvk), where
+# value_balance is the signed int sum(v_spends) - sum(v_outputs) and
+#   bvk = sum(cv_spends) - sum(cv_outputs) - [value_balance] V = [bsk] R
+def binding_keys(spends, outputs, D=b'Zcash_cv'):
+    cv_spends = _homomorphic_pedersen_commitments_ext(D, spends)
+    cv_outputs = _homomorphic_pedersen_commitments_ext(D, outputs)
+    value_balance = sum([v.s for (v, _) in spends]) - sum([v.s for (v, _) in outputs])
+    bsk = sum([rcv for (_, rcv) in spends], Fr(0)) - sum([rcv for (_, rcv) in outputs], Fr(0))
+
+    # One pass over the commitments in extended coordinates
+    acc = ext_neg(fixed_base_ext_mul(D, b'v', Fr(value_balance).s))
+    for cv in cv_spends:
+        acc = ext_add(acc, cv)
+    for cv in cv_outputs:
+        acc = ext_add(acc, ext_neg(cv))
+
+    points = [Point.from_ints(u, v) for (u, v) in ext_batch_to_affine(cv_spends + cv_outputs + [acc])]
+    n = len(cv_spends)
+    return (points[:n], points[n:-1], value_balance, bsk, points[-1])
+
+
+_spends = [(Fr(100), Fr(5)), (Fr(20), Fr(7))]
+_outputs = [(Fr(150), Fr(3))]
+(_cv_spends, _cv_outputs, _value_balance, _bsk, _bvk) = binding_keys(_spends, _outputs)
+assert _cv_spends[1] == homomorphic_pedersen_commitment(Fr(7), b'Zcash_cv', Fr(20))
+assert _value_balance == -30
+assert _bsk == Fr(9)
+assert _bvk == VALUE_COMMITMENT_RANDOMNESS_BASE * _bsk
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+from binascii import hexlify
+import mmap
+import os
+import struct
+from pyblake2 import blake2s
+
+from sapling_generators import find_group_hash, URS
+from sapling_jubjub import (
+    EXT_ZERO,
+    ext_add,
+    ext_double,
+    ext_from_affine,
+    ext_mul,
+    ext_to_affine,
+    Fr,
+    Point,
+)
+from sapling_utils import i2leosp, leos2ip
+
+#
+# Precomputed fixed-base tables
+#
+# A table file holds, for each base B, the affine points [j * 2^(w*k)] B
+# for every window k and every nonzero window value j, so that a
+# fixed-base scalar multiplication is one addition per window. Records
+# are fixed-width (u, v) pairs of little-endian field elements, and the
+# file is opened with mmap so that every process reading it shares the
+# same pages. The header records which bases the table was built for
+# and a digest of the records, and tables that fail either check are
+# rebuilt.
+#
+
+TABLE_MAGIC = b'ZTVPTBL2'
+# magic, version digest, record digest, number of bases, window bits, windows
+TABLE_HEADER = struct.Struct('<8s32s32sIBH')
+RECORD_SIZE = 64
+
+WINDOW_BITS = 4
+WINDOWS = 64 # 256 / WINDOW_BITS
+WINDOW_SIZE = 2**WINDOW_BITS - 1
+
+# (D, M) inputs to find_group_hash for the bases of the default table.
+SAPLING_TABLE_BASES = [
+    (b'Zcash_G_', b''),
+    (b'Zcash_H_', b''),
+    (b'Zcash_J_', b''),
+    (b'Zcash_PH', b'r'),
+    (b'Zcash_cv', b'v'),
+    (b'Zcash_cv', b'r'),
+] + [(b'Zcash_PH', i2leosp(32, iminus1)) for iminus1 in range(0, 4)]
+
+def table_version(bases):
+    digest = blake2s(person=b'Zcash_PT')
+    digest.update(URS)
+    digest.update(bytes([WINDOW_BITS, WINDOWS]))
+    for (D, M) in bases:
+        digest.update(bytes([len(D)]) + D)
+        digest.update(bytes([len(M)]) + M)
+    return digest.digest()
+
+def records_digest(buf):
+    digest = blake2s(person=b'Zcash_PR')
+    digest.update(buf)
+    return digest.digest()
+
+def base_records(B):
+    # Affine (u, v) of [j * 2^(w*k)] B, ordered by window k then j
+    Bk = B.ext()
+    for k in range(0, WINDOWS):
+        P = Bk
+        for j in range(1, WINDOW_SIZE + 1):
+            yield ext_to_affine(P)
+            P = ext_add(P, Bk)
+        for _ in range(0, WINDOW_BITS):
+            Bk = ext_double(Bk)
+
+def window_ext_mul(record, s):
+    # record(k, j) returns the affine (u, v) of [j * 2^(w*k)] B
+    assert 0 <= s < 2**(WINDOW_BITS * WINDOWS)
+    ret = EXT_ZERO
+    for k in range(0, WINDOWS):
+        j = (s >> (WINDOW_BITS * k)) & WINDOW_SIZE
+        if j:
+            ret = ext_add(ret, ext_from_affine(*record(k, j)))
+    return ret
+
+def build_point_table(filename, bases):
+    records = b''.join([
+        i2leosp(256, u) + i2leosp(256, v)
+        for (D, M) in bases
+        for (u, v) in base_records(find_group_hash(D, M))
+    ])
+    directory = os.path.dirname(filename)
+    if directory:
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+    tmp = '%s.%d.tmp' % (filename, os.getpid())
+    try:
+        with open(tmp, 'wb') as f:
+            f.write(TABLE_HEADER.pack(
+                TABLE_MAGIC,
+                table_version(bases),
+                records_digest(records),
+                len(bases),
+                WINDOW_BITS,
+                WINDOWS,
+            ))
+            f.write(records)
+        os.replace(tmp, filename)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+class PointTable(object):
+    def __init__(self, filename, bases):
+        with open(filename, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self._check(bases)
+        except ValueError:
+            self._mm.close()
+            raise ValueError('Stale or invalid point table: %s' % filename)
+        self.bases = list(bases)
+        self._index = dict([(bytes(self.point(i)), i) for i in range(0, len(bases))])
+
+    def _check(self, bases):
+        if len(self._mm) < TABLE_HEADER.size:
+            raise ValueError
+        (magic, version, digest, n, window_bits, windows) = TABLE_HEADER.unpack(self._mm[:TABLE_HEADER.size])
+        if (magic != TABLE_MAGIC or
+            version != table_version(bases) or
+            n != len(bases) or
+            window_bits != WINDOW_BITS or
+            windows != WINDOWS or
+            len(self._mm) != TABLE_HEADER.size + n * WINDOWS * WINDOW_SIZE * RECORD_SIZE or
+            digest != records_digest(self._mm[TABLE_HEADER.size:])):
+            raise ValueError
+        # The digest only catches accidental damage, so also check that the
+        # first record of each base is the base itself.
+        for (i, (D, M)) in enumerate(bases):
+            if self.point(i) != find_group_hash(D, M):
+                raise ValueError
+
+    def close(self):
+        self._mm.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _record(self, base, k, j):
+        offset = TABLE_HEADER.size + (((base * WINDOWS) + k) * WINDOW_SIZE + (j - 1)) * RECORD_SIZE
+        return (leos2ip(self._mm[offset:offset+32]), leos2ip(self._mm[offset+32:offset+64]))
+
+    def point(self, base, k=0, j=1):
+        return Point.from_ints(*self._record(base, k, j))
+
+    def index(self, P):
+        return self._index.get(bytes(P))
+
+    def ext_mul(self, base, s):
+        return window_ext_mul(lambda k, j: self._record(base, k, j), s)
+
+    def mul(self, base, s):
+        return Point.from_ext(self.ext_mul(base, s.s))
+
+def point_table(filename, bases=SAPLING_TABLE_BASES):
+    try:
+        return PointTable(filename, bases)
+    except (FileNotFoundError, ValueError):
+        build_point_table(filename, bases)
+        return PointTable(filename, bases)
+
+
+#
+# Shared default table
+#
+# The table lives in the per-user cache directory, or at the path given
+# by the SAPLING_POINT_TABLE environment variable. Each process opens it
+# on first use (building it if no process has done so yet), so pool
+# workers all map the same file.
+#
+
+def default_point_table_file():
+    if os.environ.get('SAPLING_POINT_TABLE'):
+        return os.environ['SAPLING_POINT_TABLE']
+    cache = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(
+        cache,
+        'zcash-test-vectors',
+        'sapling_point_table_%s.bin' % hexlify(table_version(SAPLING_TABLE_BASES)[:8]).decode(),
+    )
+
+_sapling_point_table = None
+
+def sapling_point_table():
+    global _sapling_point_table
+    if _sapling_point_table is None:
+        _sapling_point_table = point_table(default_point_table_file())
+    return _sapling_point_table
+
+_fixed_bases = {}
+
+# find_group_hash(D, M), read from the shared table when it covers the base.
+def fixed_base(D, M):
+    if (D, M) in SAPLING_TABLE_BASES:
+        return sapling_point_table().point(SAPLING_TABLE_BASES.index((D, M)))
+    if (D, M) not in _fixed_bases:
+        _fixed_bases[(D, M)] = find_group_hash(D, M)
+    return _fixed_bases[(D, M)]
+
+# [s] find_group_hash(D, M) in extended coordinates.
+def fixed_base_ext_mul(D, M, s):
+    if (D, M) in SAPLING_TABLE_BASES:
+        return sapling_point_table().ext_mul(SAPLING_TABLE_BASES.index((D, M)), s)
+    return ext_mul(fixed_base(D, M).ext(), s)
+
+# [s] P for a fixed generator P, using the shared table when it covers P.
+def fixed_base_mul(P, s):
+    table = sapling_point_table()
+    i = table.index(P)
+    if i is None:
+        return P * s
+    return table.mul(i, s)
+
+
+_B = find_group_hash(*SAPLING_TABLE_BASES[5])
+_records = list(base_records(_B))
+_s = Fr(6554484396890773809930967563523245729705921265872317281365359162392183254198)
+assert Point.from_ints(*_records[0]) == _B
+assert Point.from_ext(window_ext_mul(lambda k, j: _records[k * WINDOW_SIZE + j - 1], _s.s)) == _B * _s
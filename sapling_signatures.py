@@ -5,8 +5,9 @@ from pyblake2 import blake2b
 from sapling_generators import SPENDING_KEY_BASE
 from sapling_jubjub import Fr, Point, r_j
 from sapling_key_components import to_scalar
+from sapling_point_tables import fixed_base_mul
 from sapling_utils import cldiv, leos2ip
-from tv_output import render_args, render_tv
+from tv_output import render_args, render_tv, verify_tv
 
 
 def H(x):
@@ -33,7 +34,7 @@ class RedJubjub(object):
         return to_scalar(self._random(64))
 
     def derive_public(self, sk):
-        return self.P_g * sk
+        return fixed_base_mul(self.P_g, sk)
 
     def gen_random(self):
         T = self._random((self.l_H + 128) // 8)
@@ -44,12 +45,12 @@ class RedJubjub(object):
         return sk + alpha
 
     def randomize_public(self, vk, alpha):
-        return vk + self.P_g * alpha
+        return vk + fixed_base_mul(self.P_g, alpha)
 
     def sign(self, sk, M):
         T = self._random((self.l_H + 128) // 8)
         r = h_star(T + M)
-        R = self.P_g * r
+        R = fixed_base_mul(self.P_g, r)
         Rbar = bytes(R)
         S = r + h_star(Rbar + M) * sk
         Sbar = bytes(S) # TODO: bitlength(r_j)
@@ -61,11 +62,39 @@ class RedJubjub(object):
         R = Point.from_bytes(Rbar)
         S = leos2ip(Sbar)
         c = h_star(Rbar + M)
-        return R and S < r_j and self.P_g * Fr(S) == R + vk * c
-
+        return R and S < r_j and fixed_base_mul(self.P_g, Fr(S)) == R + vk * c
+
+
+SIGNATURES_PARTS = (
+    ('sk', '[u8; 32]'),
+    ('vk', '[u8; 32]'),
+    ('alpha', '[u8; 32]'),
+    ('rsk', '[u8; 32]'),
+    ('rvk', '[u8; 32]'),
+    ('m', '[u8; 32]'),
+    ('sig', '[u8; 64]'),
+    ('rsig', '[u8; 64]'),
+)
+
+def recompute_signatures_tv(tv):
+    rj = RedJubjub(SPENDING_KEY_BASE)
+    sk = to_scalar(tv['sk'])
+    alpha = to_scalar(tv['alpha'])
+    vk = rj.derive_public(sk)
+    rvk = rj.randomize_public(vk, alpha)
+    return {
+        'vk': bytes(vk),
+        'rsk': bytes(rj.randomize_private(sk, alpha)),
+        'rvk': bytes(rvk),
+        'sig': tv['sig'] if rj.verify(vk, tv['m'], tv['sig']) else None,
+        'rsig': tv['rsig'] if rj.verify(rvk, tv['m'], tv['rsig']) else None,
+    }
 
 def main():
     args = render_args()
+    if args.verify:
+        verify_tv(args, 'sapling_signatures', SIGNATURES_PARTS, recompute_signatures_tv)
+        return
 
     from random import Random
     rng = Random(0xabad533d)
@@ -106,16 +135,7 @@ def main():
     render_tv(
         args,
         'sapling_signatures',
-        (
-            ('sk', '[u8; 32]'),
-            ('vk', '[u8; 32]'),
-            ('alpha', '[u8; 32]'),
-            ('rsk', '[u8; 32]'),
-            ('rvk', '[u8; 32]'),
-            ('m', '[u8; 32]'),
-            ('sig', '[u8; 64]'),
-            ('rsig', '[u8; 64]'),
-        ),
+        SIGNATURES_PARTS,
         test_vectors,
     )
 
@@ -1,6 +1,12 @@
 import argparse
-from binascii import hexlify
+from binascii import hexlify, unhexlify
+from functools import partial
+from itertools import islice
 import json
+from multiprocessing import cpu_count, Pool
+import sys
+
+from sapling_utils import cldiv
 
 
 def chunk(h):
@@ -86,6 +92,150 @@ def tv_rust(filename, parts, vectors):
         raise ValueError('Invalid type(vectors)')
 
 
+#
+# Parsing
+#
+
+def tv_value_parse(name, value, typ, bitcoin_flavoured):
+    if typ.startswith('[u8; '):
+        value = unhexlify(value)
+        if len(value) != int(typ[5:-1]):
+            raise ValueError('Invalid length for %s: %d bytes, expected %s' % (name, len(value), typ))
+        if bitcoin_flavoured and len(value) == 32:
+            value = value[::-1]
+        return value
+    return int(value)
+
+def tv_json_read(lines, parts, bitcoin_flavoured):
+    names = None
+    for line in lines:
+        line = line.strip().rstrip(',')
+        if line in ('[', ']', ''):
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            raise ValueError('not a zcash-target file: %s' % line)
+        if len(row) == 1 and type(row[0]) == str:
+            if row[0].startswith('From '):
+                continue
+            names = row[0].split(', ')
+            if names != [p[0] for p in parts]:
+                raise ValueError('Unexpected fields: %s' % row[0])
+            continue
+        if names is None or len(row) != len(parts):
+            raise ValueError('Invalid row: %s' % line)
+        yield dict([(p[0], tv_value_parse(p[0], v, p[1], bitcoin_flavoured)) for (p, v) in zip(parts, row)])
+    if names is None:
+        raise ValueError('not a zcash-target file: no field names found')
+
+def tv_rust_read(lines, parts):
+    types = dict(parts)
+    names = None
+    in_struct = False
+    vector = None
+    name = None
+    for line in lines:
+        line = line.strip()
+        if line == 'struct TestVector {':
+            in_struct = True
+            names = []
+        elif in_struct:
+            if line == '};':
+                in_struct = False
+                if names != [p[0] for p in parts]:
+                    raise ValueError('Unexpected fields: %s' % ', '.join(names))
+            else:
+                names.append(line.split(':')[0])
+        elif line.endswith('TestVector {'):
+            if names is None:
+                raise ValueError('not a rust-target file: %s' % line)
+            vector = {}
+        elif vector is None:
+            continue
+        elif name is not None:
+            if line == '],':
+                vector[name] = tv_value_parse(name, ''.join(hexbuf), types[name], False)
+                name = None
+            else:
+                octets = [b.strip() for b in line.split(',') if b.strip()]
+                if not all([len(b) == 4 and b.startswith('0x') for b in octets]):
+                    raise ValueError('Malformed line: %s' % line)
+                hexbuf.extend([b[2:] for b in octets])
+        elif line.endswith(': ['):
+            name = line[:-3]
+            if name not in types:
+                raise ValueError('Unexpected field: %s' % name)
+            hexbuf = []
+        elif line in ('},', '};'):
+            if sorted(vector.keys()) != sorted(types.keys()):
+                raise ValueError('Incomplete test vector')
+            yield vector
+            vector = None
+        elif ':' in line:
+            (key, value) = line.rstrip(',').split(':', 1)
+            if key not in types:
+                raise ValueError('Unexpected field: %s' % key)
+            vector[key] = tv_value_parse(key, value.strip(), types[key], False)
+        else:
+            raise ValueError('Malformed line: %s' % line)
+    if names is None:
+        raise ValueError('not a rust-target file: no TestVector struct found')
+
+
+#
+# Verification
+#
+
+def tv_check(recompute, bitcoin_flavoured, vector):
+    try:
+        recomputed = recompute(vector)
+    except Exception as e:
+        return [('recomputation failed: %s %s' % (type(e).__name__, e)).rstrip()]
+    mismatches = []
+    for (name, expected) in sorted(recomputed.items()):
+        if expected is None:
+            mismatches.append('%s: does not verify' % name)
+        elif expected != vector[name]:
+            mismatches.append('%s: expected %s, got %s' % (
+                name,
+                tv_value_json(expected, bitcoin_flavoured),
+                tv_value_json(vector[name], bitcoin_flavoured),
+            ))
+    return mismatches
+
+# Rows are handed to the pool in bounded batches, so that the file is
+# never read much further ahead than the workers have got.
+VERIFY_BATCH_SIZE = 1024
+
+def verify_tv(args, filename, parts, recompute):
+    check = partial(tv_check, recompute, args.target == 'zcash')
+    count = 0
+    failures = 0
+    try:
+        with open(args.verify) as f, Pool() as pool:
+            if args.target == 'rust':
+                vectors = tv_rust_read(f, parts)
+            elif args.target == 'zcash':
+                vectors = tv_json_read(f, parts, True)
+            chunksize = cldiv(VERIFY_BATCH_SIZE, 4 * cpu_count())
+            while True:
+                batch = list(islice(vectors, VERIFY_BATCH_SIZE))
+                if not batch:
+                    break
+                for mismatches in pool.map(check, batch, chunksize):
+                    for mismatch in mismatches:
+                        print('%s[%d] %s' % (filename, count, mismatch))
+                    if mismatches:
+                        failures += 1
+                    count += 1
+    except (OSError, ValueError) as e:
+        sys.exit('%s: %s' % (args.verify, e))
+    print('%s: %d test vectors checked, %d mismatching' % (filename, count, failures))
+    if failures:
+        sys.exit(1)
+
+
 #
 # Rendering functions
 #
@@ -93,6 +243,8 @@ def tv_rust(filename, parts, vectors):
 def render_args():
     parser = argparse.ArgumentParser()
     parser.add_argument('-t', '--target', choices=['zcash', 'rust'], default='rust')
+    parser.add_argument('--verify', metavar='FILE',
+                        help='check the test vectors in FILE instead of rendering them')
     return parser.parse_args()
 
 def render_tv(args, filename, parts, vectors):